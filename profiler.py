@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Base directory for profiling results (one sub-directory per run)
+PROFILE_DIR = 'profile_reports'
+
+# Report directory structure:
+# profile_reports/telegram_stock_reports_20240715_093000/
+#   wallclock_all.folded      # All samples, stage name as the root frame
+#   wallclock_<stage>.folded  # Samples for a single stage
+#   memory.txt                # tracemalloc diffs around PDF handling
+#   slow_callbacks.txt        # Event loop stalls, broken down by call site
+#   summary.json              # Stage wall times and sample counts
+#
+# The .folded files use the collapsed stack format understood by
+# flamegraph.pl and speedscope. They are wall-clock samples taken from a
+# Python thread, which needs the GIL to take a sample: time blocked on sockets
+# or sleep is fully sampled, CPU-bound code (parsing, PDF extraction) gets
+# fewer samples than the time it takes. Use the stage wall_time in
+# summary.json for timings and the flamegraphs for where time goes in a stage.
+
+
+class Profiler:
+    """Wall-clock sampler, tracemalloc snapshots and event loop stall detector for --profile runs"""
+
+    def __init__(self, name, enabled=False, interval=0.005, slow_callback_duration=0.1,
+                 watched_coroutines=()):
+        self.name = name
+        self.enabled = enabled
+        self.interval = interval
+        self.slow_callback_duration = slow_callback_duration
+        self.watched_coroutines = set(watched_coroutines)
+
+        self._stage = 'other'
+        self._stage_times = Counter()
+        self._samples = Counter()
+        self._memory_records = []
+        self._slow_callbacks = []
+        self._current_step = None
+        self._heartbeat = None
+        self._loop = None
+        self._main_thread_id = threading.main_thread().ident
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._started = False
+
+    def start(self):
+        """Start the sampler thread"""
+        if not self.enabled or self._started:
+            return
+        self._started = True
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        print(f"[PROFILE MODE] Sampling every {self.interval * 1000:.0f}ms")
+
+    def stop(self):
+        """Stop profiling and write the report directory"""
+        if not self._started:
+            return
+        self._started = False
+        self._stop_event.set()
+        self._thread.join()
+        self._finish_step(time.perf_counter())
+        self._write_report()
+
+    @contextmanager
+    def stage(self, name):
+        """Attribute samples and wall time inside the block to a named stage
+
+        The current stage is shared by the whole thread, so only wrap synchronous
+        code. Around an await, other tasks would be charged to the stage.
+        """
+        if not self._started:
+            yield
+            return
+        previous = self._stage
+        self._stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stage_times[name] += time.perf_counter() - start
+            self._stage = previous
+
+    @contextmanager
+    def memory(self, label):
+        """Record a tracemalloc snapshot diff and peak usage for the block
+
+        Tracing is only switched on inside the block, so stages outside it are
+        sampled without tracemalloc overhead.
+        """
+        if not self._started:
+            yield
+            return
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            try:
+                after = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                filters = [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                    tracemalloc.Filter(False, threading.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+                ]
+                diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+                self._memory_records.append({
+                    'label': label,
+                    'size_diff': sum(stat.size_diff for stat in diff),
+                    'current': current,
+                    'peak': peak,
+                    'top': [str(stat) for stat in diff[:10]],
+                })
+            finally:
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def watch_event_loop(self, loop):
+        """Flag event loop steps that block for longer than slow_callback_duration"""
+        if not self._started:
+            return
+        self._loop = loop
+        self._heartbeat = time.perf_counter()
+        loop.call_soon(self._beat)
+
+    def _beat(self):
+        self._heartbeat = time.perf_counter()
+        if self._started:
+            self._loop.call_later(self.slow_callback_duration / 4, self._beat)
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._main_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame)
+                frame = frame.f_back
+            stack.reverse()
+
+            stage = self._stage
+            self._samples[(stage, tuple(self._format_frame(f) for f in stack))] += 1
+
+            if self._heartbeat is not None:
+                self._check_stall(stack, stage)
+
+    def _check_stall(self, stack, stage):
+        now = time.perf_counter()
+        heartbeat = self._heartbeat
+        if not self._loop.is_running():
+            self._finish_step(now)
+            return
+        step = self._current_step
+        if step is None or step['started'] != heartbeat:
+            # The heartbeat ran, so the previous loop step ended before it
+            self._finish_step(heartbeat)
+            step = self._current_step = {
+                'started': heartbeat,
+                'last_sample': heartbeat,
+                'last_key': None,
+                'coroutine': None,
+                'breakdown': Counter(),
+            }
+
+        # Innermost watched coroutine on the stack and the call it is blocked in
+        coroutine, call_site, callee = None, None, stack[-1] if stack else None
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index].f_code.co_name in self.watched_coroutines:
+                coroutine = stack[index].f_code.co_name
+                call_site = self._format_frame(stack[index])
+                callee = stack[index + 1] if index + 1 < len(stack) else None
+                break
+
+        # Charge the time since the previous sample to what the loop is doing now
+        key = (stage, call_site, self._format_frame(callee) if callee else None)
+        step['breakdown'][key] += now - step['last_sample']
+        step['last_sample'] = now
+        step['last_key'] = key
+        if step['coroutine'] is None:
+            step['coroutine'] = coroutine
+
+    def _finish_step(self, end):
+        step = self._current_step
+        self._current_step = None
+        if step is None:
+            return
+        duration = end - step['started']
+        if duration < self.slow_callback_duration:
+            return
+        if step['last_key'] is not None and end > step['last_sample']:
+            step['breakdown'][step['last_key']] += end - step['last_sample']
+        stall = {
+            'duration': duration,
+            'coroutine': step['coroutine'],
+            'breakdown': step['breakdown'].most_common(),
+        }
+        self._slow_callbacks.append(stall)
+        where = stall['coroutine'] or 'event loop'
+        print(f"[PROFILE] Event loop blocked for {duration:.3f}s in {where}")
+
+    @staticmethod
+    def _format_frame(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def _write_report(self):
+        report_dir = os.path.join(PROFILE_DIR, f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        try:
+            os.makedirs(report_dir, exist_ok=True)
+
+            by_stage = {}
+            for (stage, stack), count in self._samples.items():
+                by_stage.setdefault(stage, []).append((stack, count))
+
+            with open(os.path.join(report_dir, 'wallclock_all.folded'), 'w', encoding='utf-8') as f:
+                for stage, samples in by_stage.items():
+                    for stack, count in samples:
+                        f.write(f"{';'.join((stage,) + stack)} {count}\n")
+
+            for stage, samples in by_stage.items():
+                filename = f"wallclock_{stage.replace(os.sep, '_')}.folded"
+                with open(os.path.join(report_dir, filename), 'w', encoding='utf-8') as f:
+                    for stack, count in samples:
+                        f.write(f"{';'.join(stack)} {count}\n")
+
+            with open(os.path.join(report_dir, 'memory.txt'), 'w', encoding='utf-8') as f:
+                for record in self._memory_records:
+                    f.write(f"== {record['label']} ==\n")
+                    f.write(f"size diff: {record['size_diff'] / 1024:.1f} KiB, "
+                            f"current: {record['current'] / 1024:.1f} KiB, "
+                            f"peak: {record['peak'] / 1024:.1f} KiB\n")
+                    for line in record['top']:
+                        f.write(f"  {line}\n")
+                    f.write("\n")
+
+            with open(os.path.join(report_dir, 'slow_callbacks.txt'), 'w', encoding='utf-8') as f:
+                f.write(f"Threshold: {self.slow_callback_duration:.3f}s\n\n")
+                for stall in sorted(self._slow_callbacks, key=lambda s: s['duration'], reverse=True):
+                    f.write(f"{stall['duration']:.3f}s in {stall['coroutine'] or 'event loop'}\n")
+                    for (stage, call_site, callee), seconds in stall['breakdown']:
+                        where = ' -> '.join(part for part in (call_site, callee) if part)
+                        f.write(f"  {seconds:.3f}s (stage: {stage}) {where}\n")
+                    f.write("\n")
+
+            # 'other' is never entered through stage(), so it gets the untracked remainder
+            wall_time = time.perf_counter() - self._start_time
+            stage_times = dict(self._stage_times)
+            stage_times['other'] = max(0.0, wall_time - sum(self._stage_times.values()))
+
+            summary = {
+                'name': self.name,
+                'wall_time': wall_time,
+                'interval': self.interval,
+                'stages': {
+                    stage: {
+                        'wall_time': stage_times.get(stage, 0.0),
+                        'samples': sum(count for _, count in samples),
+                    }
+                    for stage, samples in by_stage.items()
+                },
+                'memory_blocks': len(self._memory_records),
+                'slow_callbacks': len(self._slow_callbacks),
+            }
+            with open(os.path.join(report_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+
+            print(f"Profile report written to {report_dir}")
+        except Exception as e:
+            print(f"Error writing profile report: {e}")
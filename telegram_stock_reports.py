@@ -16,6 +16,7 @@ from openai import OpenAI
 import PyPDF2
 import io
 import sys
+from profiler import Profiler
 
 # Enable logging for debugging
 logging.basicConfig(level=logging.INFO)
@@ -45,6 +46,13 @@ else:
 
 TIMEZONE = pytz.timezone('Asia/Seoul')
 
+# Profiling support (--profile): CPU samples per stage, PDF memory usage and event loop stalls
+profiler = Profiler(
+    'telegram_stock_reports',
+    enabled='--profile' in sys.argv,
+    watched_coroutines=('process_yesterday_reports', 'download_and_summarize_report')
+)
+
 # Initialize client
 client = TelegramClient('stock_reports_session', API_ID, API_HASH)
 
@@ -192,11 +200,13 @@ def scrape_yesterday_reports():
         target_url = f'https://finance.naver.com/research/company_list.naver?&page={page_number}'
         
         try:
-            response = requests.get(target_url, headers={'User-Agent': 'Mozilla/5.0'})
+            with profiler.stage('fetch_page'):
+                response = requests.get(target_url, headers={'User-Agent': 'Mozilla/5.0'})
             
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                table = soup.find('table')
+                with profiler.stage('parse_page'):
+                    soup = BeautifulSoup(response.content, 'html.parser')
+                    table = soup.find('table')
                 
                 if not table:
                     print(f"No table found on page {page_number}")
@@ -329,14 +339,17 @@ async def download_and_summarize_report(report_data):
         print(f"Downloading PDF for {report_data['company_name']}...")
         print(f"PDF URL: {report_data['pdf_url']}")
         
-        # Download the PDF
-        response = requests.get(report_data['pdf_url'], headers={'User-Agent': 'Mozilla/5.0'})
-        response.raise_for_status()
-        
-        print(f"PDF downloaded successfully. Size: {len(response.content)} bytes")
-        
-        # Extract text from first page
-        pdf_text = extract_text_from_pdf_first_page(response.content)
+        with profiler.memory(f"{report_data['company_name']} - {report_data['report_title']}"):
+            # Download the PDF
+            with profiler.stage('download_pdf'):
+                response = requests.get(report_data['pdf_url'], headers={'User-Agent': 'Mozilla/5.0'})
+                response.raise_for_status()
+            
+            print(f"PDF downloaded successfully. Size: {len(response.content)} bytes")
+            
+            # Extract text from first page
+            with profiler.stage('extract_text'):
+                pdf_text = extract_text_from_pdf_first_page(response.content)
         
         print(f"Extracted text length: {len(pdf_text)} characters")
         print(f"First 200 characters: {pdf_text[:200]}...")
@@ -346,12 +359,13 @@ async def download_and_summarize_report(report_data):
             return None
         
         # Summarize with LLM
-        summary = summarize_pdf_with_llm(
-            pdf_text, 
-            report_data['company_name'], 
-            report_data['report_title'], 
-            report_data['research_firm']
-        )
+        with profiler.stage('summarize'):
+            summary = summarize_pdf_with_llm(
+                pdf_text, 
+                report_data['company_name'], 
+                report_data['report_title'], 
+                report_data['research_firm']
+            )
         
         return {
             **report_data,
@@ -510,26 +524,29 @@ async def process_yesterday_reports():
 async def main():
     print("Starting stock report processing...")
     
-    # Handle command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--clear-checkpoint':
+    # Handle command line arguments (--profile is picked up at startup)
+    args = [arg for arg in sys.argv[1:] if arg != '--profile']
+    if args:
+        if args[0] == '--clear-checkpoint':
             clear_checkpoint()
             print("Checkpoint cleared. Starting fresh...")
-        elif sys.argv[1] == '--help':
+        elif args[0] == '--help':
             print("""
 Usage: python telegram_stock_reports.py [OPTIONS]
 
 Options:
   --clear-checkpoint    Clear the checkpoint file and start fresh
+  --profile            Write CPU, memory and event loop stall profiles to profile_reports/
   --help               Show this help message
 
 Examples:
   python telegram_stock_reports.py                    # Normal run (resumes if checkpoint exists)
   python telegram_stock_reports.py --clear-checkpoint # Clear checkpoint and start fresh
+  python telegram_stock_reports.py --profile          # Normal run with profiling
             """)
             return
         else:
-            print(f"Unknown argument: {sys.argv[1]}")
+            print(f"Unknown argument: {args[0]}")
             print("Use --help for usage information")
             return
     
@@ -554,4 +571,9 @@ if __name__ == '__main__':
     # Create a new event loop and run the main function
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(main()) 
\ No newline at end of file
+    profiler.start()
+    profiler.watch_event_loop(loop)
+    try:
+        loop.run_until_complete(main())
+    finally:
+        profiler.stop()
@@ -1,12 +1,139 @@
 import requests
 from bs4 import BeautifulSoup
 import csv
+import io
 import os
-from urllib.parse import urljoin, quote
+from urllib.parse import urljoin, quote, urlparse, parse_qs
 import time
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from profiler import Profiler
 
 page_number_start = 1
 
+# View count refresh settings (--refresh-views)
+refresh_workers = 4
+refresh_requests_per_second = 4
+
+# Profiling support (--profile): CPU samples per stage and PDF memory usage
+profiler = Profiler('web_scraper', enabled='--profile' in sys.argv)
+profiler.start()
+
+class RateLimiter:
+    """Spread request start times across threads to stay under a requests-per-second limit"""
+
+    def __init__(self, requests_per_second):
+        self.min_interval = 1.0 / requests_per_second
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.min_interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+def fetch_listing_page(page_number, rate_limiter):
+    """Fetch a listing page and return the parsed soup (no PDFs are downloaded)"""
+    target_url = f'https://finance.naver.com/research/company_list.naver?&page={page_number}'
+    rate_limiter.wait()
+    response = requests.get(target_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+    response.raise_for_status()
+    return BeautifulSoup(response.content, 'html.parser')
+
+def get_view_counts(soup):
+    """Map PDF link to view count for every report row on a listing page"""
+    view_counts = {}
+    table = soup.find('table')
+    if not table:
+        return view_counts
+    for row in table.find_all('tr')[1:]:  # Skip the header row
+        columns = row.find_all('td')
+        if len(columns) == 6:
+            pdf_link_tag = columns[3].find('a')
+            if pdf_link_tag and 'href' in pdf_link_tag.attrs:
+                view_counts[pdf_link_tag['href']] = columns[5].get_text(strip=True)
+    return view_counts
+
+def get_last_page_number(soup):
+    """Read the last page number from the '맨뒤' pagination link"""
+    last_link = soup.select_one('td.pgRR a[href]')
+    if not last_link:
+        return 1
+    page = parse_qs(urlparse(last_link['href']).query).get('page')
+    return int(page[0]) if page else 1
+
+def refresh_view_counts(csv_file):
+    """Update the View Count column of existing rows from the listing pages only"""
+    if not os.path.exists(csv_file):
+        print(f"{csv_file} not found, nothing to refresh.")
+        return
+
+    rate_limiter = RateLimiter(refresh_requests_per_second)
+    try:
+        first_page = fetch_listing_page(1, rate_limiter)
+    except Exception as e:
+        print(f"Failed to retrieve the webpage for page 1: {e}")
+        return
+    last_page = get_last_page_number(first_page)
+    latest_counts = get_view_counts(first_page)
+    print(f"Refreshing view counts from {last_page} pages...")
+
+    with ThreadPoolExecutor(max_workers=refresh_workers) as executor:
+        futures = {
+            executor.submit(fetch_listing_page, page_number, rate_limiter): page_number
+            for page_number in range(2, last_page + 1)
+        }
+        for future in as_completed(futures):
+            page_number = futures[future]
+            try:
+                latest_counts.update(get_view_counts(future.result()))
+            except Exception as e:
+                print(f"Failed to retrieve the webpage for page {page_number}: {e}")
+
+    with profiler.stage('update_csv'):
+        with open(csv_file, 'rb') as f:
+            lines = f.readlines()
+        updated = 0
+        for index, line in enumerate(lines[1:], 1):  # Skip header
+            try:
+                row = next(csv.reader([line.decode('utf-8')]))
+            except (UnicodeDecodeError, csv.Error, StopIteration):
+                continue
+            if len(row) != 6 or row[3] not in latest_counts:
+                continue
+            view_count = latest_counts[row[3]]
+            if view_count == row[5]:
+                continue  # Unchanged row, leave its bytes alone
+
+            row[5] = view_count
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(row)
+            lines[index] = buffer.getvalue().encode('utf-8')
+            updated += 1
+
+        # Write to a temp file and swap it in, so an interrupted write can't corrupt the CSV
+        if updated:
+            temp_file = csv_file + '.tmp'
+            try:
+                with open(temp_file, 'wb') as f:
+                    f.writelines(lines)
+                os.replace(temp_file, csv_file)
+            except BaseException:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+
+    print(f"View counts updated for {updated} reports ({len(latest_counts)} listed reports checked).")
+
+if '--refresh-views' in sys.argv:
+    refresh_view_counts('company_reports.csv')
+    profiler.stop()
+    sys.exit(0)
+
 # Loop through pages from 974 to 1
 # for page_number in range(974, 0, -1):
 for page_number in range(page_number_start, 30):
@@ -14,15 +141,17 @@ for page_number in range(page_number_start, 30):
     target_url = f'https://finance.naver.com/research/company_list.naver?&page={page_number}'
     
     # Send a GET request to the webpage
-    response = requests.get(target_url)
+    with profiler.stage('fetch_page'):
+        response = requests.get(target_url)
     
     # Check if the request was successful
     if response.status_code == 200:
         # Parse the HTML content of the page
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Find the table containing the company research reports
-        table = soup.find('table')
+        with profiler.stage('parse_page'):
+            soup = BeautifulSoup(response.content, 'html.parser')
+            
+            # Find the table containing the company research reports
+            table = soup.find('table')
         
         # Function to read existing CSV and get existing PDF links
         def get_existing_links(csv_file):
@@ -116,10 +245,11 @@ for page_number in range(page_number_start, 30):
                         
                         # Download the PDF
                         try:
-                            r = requests.get(pdf_url, headers=headers)
-                            r.raise_for_status()
-                            with open(file_path, 'wb') as f:
-                                f.write(r.content)
+                            with profiler.memory(filename), profiler.stage('download_pdf'):
+                                r = requests.get(pdf_url, headers=headers)
+                                r.raise_for_status()
+                                with open(file_path, 'wb') as f:
+                                    f.write(r.content)
                             print(f"Downloaded: {file_path}")
                             
                             # Add a delay to avoid being blocked
@@ -135,4 +265,6 @@ for page_number in range(page_number_start, 30):
                     else:
                         print(f"No PDF link found for {company_name}.")
     else:
-        print(f"Failed to retrieve the webpage for page {page_number}. Status code: {response.status_code}") 
\ No newline at end of file
+        print(f"Failed to retrieve the webpage for page {page_number}. Status code: {response.status_code}")
+
+profiler.stop()